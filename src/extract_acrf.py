@@ -4,13 +4,24 @@ Author: Santhosh RK
 """
 
 import fitz  # PyMuPDF
+import csv
+import datetime
 import json
 import os
 import logging
 import re
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from dateutil import parser as date_parser  # For robust date parsing
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+
+try:
+    import orjson  # Optional, much faster JSON encoder
+except ImportError:
+    orjson = None
 
 # Configure logging to write alongside this script using the script name
 log_file = os.path.join(
@@ -22,6 +33,67 @@ logging.basicConfig(
     format="%(asctime)s - %(levelname)s - %(message)s",
     handlers=[logging.FileHandler(log_file), logging.StreamHandler()],
 )
+logger = logging.getLogger(__name__)
+
+# Patterns used on the annotation hot path, compiled once
+# Default appearance operators: "/Font size Tf" or "r g b rg"
+_DA_RE = re.compile(r'/(\S+)\s+(\d+)\s+Tf|(\d*\.?\d+)\s+(\d*\.?\d+)\s+(\d*\.?\d+)\s+rg')
+_TZ_RE = re.compile(r"'(\d{2})'")
+
+# One styled text span; kept as a tuple because pages can hold many thousands
+StyledSpan = namedtuple("StyledSpan", "page_number text font font_size font_color bbox")
+
+# Scalar annotation values treated as missing
+_EMPTY = frozenset([None, ''])
+
+# NUL and carriage return, stripped from values by clean_value_for_excel
+_BAD_CHARS = {0: None, 13: None}
+
+# Excel header styles, built once and shared by every sheet
+HEADER_FILL = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
+HEADER_FONT = Font(name='Calibri', size=11, bold=True, color="FFFFFF")
+HEADER_ALIGN = Alignment(horizontal='center', vertical='center', wrap_text=True)
+BORDER = Border(
+    left=Side(style='thin'),
+    right=Side(style='thin'),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+
+
+def _parse_pdf_date_fast(pdf_date_str):
+    """Parse a D:YYYYMMDDHHmmSSOHH'mm' PDF date string by slicing.
+
+    Raises ValueError when the string does not follow the PDF date grammar.
+    """
+    if pdf_date_str.startswith("D:"):
+        pdf_date_str = pdf_date_str[2:]
+
+    digits = pdf_date_str[:14]
+    if len(digits) < 4 or not digits.isdigit():
+        raise ValueError(f"Not a PDF date: {pdf_date_str!r}")
+
+    tzinfo = None
+    tz = pdf_date_str[14:]
+    if tz:
+        if tz[0] == 'Z':
+            tzinfo = datetime.timezone.utc
+        elif tz[0] in '+-':
+            minutes = tz[3:].replace("'", "")
+            offset = datetime.timedelta(hours=int(tz[1:3]), minutes=int(minutes or 0))
+            tzinfo = datetime.timezone(-offset if tz[0] == '-' else offset)
+        else:
+            raise ValueError(f"Invalid PDF date timezone: {tz!r}")
+
+    return datetime.datetime(
+        int(digits[0:4]),
+        int(digits[4:6] or 1),
+        int(digits[6:8] or 1),
+        int(digits[8:10] or 0),
+        int(digits[10:12] or 0),
+        int(digits[12:14] or 0),
+        tzinfo=tzinfo,
+    )
 
 
 def parse_pdf_date(pdf_date_str):
@@ -33,16 +105,21 @@ def parse_pdf_date(pdf_date_str):
     if pdf_date_str in {"00000000000000Z", "D:00000000000000Z"}:
         return None
 
+    try:
+        return _parse_pdf_date_fast(pdf_date_str)
+    except ValueError:
+        pass
+
     try:
         return fitz.parse_pdf_date(pdf_date_str)
     except Exception:
         try:
             if pdf_date_str.startswith("D:"):
                 pdf_date_str = pdf_date_str[2:]
-            pdf_date_str = re.sub(r"'(\d{2})'", r"\1", pdf_date_str)
+            pdf_date_str = _TZ_RE.sub(r"\1", pdf_date_str)
             return date_parser.parse(pdf_date_str, fuzzy=True)
         except Exception as exc:
-            logging.debug(f"Failed to parse date '{pdf_date_str}': {exc}")
+            logger.debug("Failed to parse date '%s': %s", pdf_date_str, exc)
             return None
 
 
@@ -58,145 +135,222 @@ def extract_annotations(page, page_number):
                 continue
                 
             try:
-                # Basic annotation properties
+                # Basic annotation properties; info and colors are rebuilt by
+                # PyMuPDF on every access, so fetch them once
+                info = annot.info or {}
+                colors = annot.colors or {}
+                # contents, text, popup, line_endpoints and quad_points are not
+                # exposed by every PyMuPDF release
+                contents = getattr(annot, 'contents', None)
                 annot_info = {
                     'page_number': page_number,
-                    'type': annot.type[1] if hasattr(annot, 'type') and annot.type else 'Unknown',
-                    'rect': [round(coord, 2) for coord in annot.rect] if hasattr(annot, 'rect') else None,
-                    'flags': annot.flags if hasattr(annot, 'flags') else None,
+                    'type': annot.type[1] if annot.type else 'Unknown',
+                    'rect': [round(coord, 2) for coord in annot.rect],
+                    'flags': annot.flags,
                     
                     # Content and text
-                    'contents': annot.contents.strip() if hasattr(annot, 'contents') and annot.contents else None,
-                    'text': annot.text if hasattr(annot, 'text') else None,
+                    'contents': contents.strip() if contents else None,
+                    'text': getattr(annot, 'text', None),
                     
                     # Appearance properties
                     'colors': {
-                        'stroke': annot.colors.get('stroke') if hasattr(annot, 'colors') else None,
-                        'fill': annot.colors.get('fill') if hasattr(annot, 'colors') else None
+                        'stroke': colors.get('stroke'),
+                        'fill': colors.get('fill')
                     },
-                    'opacity': annot.opacity if hasattr(annot, 'opacity') else None,
-                    'border': annot.border if hasattr(annot, 'border') else None,
+                    'opacity': annot.opacity,
+                    'border': annot.border,
                     
                     # Metadata
                     'modification_date': None,  # Will be populated from info
                     'creation_date': None,      # Will be populated from info
-                    'popup_rect': [round(coord, 2) for coord in annot.popup_rect] if hasattr(annot, 'popup_rect') else None,
-                    'popup': annot.popup if hasattr(annot, 'popup') else None,
+                    'popup_rect': [round(coord, 2) for coord in annot.popup_rect],
+                    'popup': getattr(annot, 'popup', None),
                     
                     # Line and vertex properties
-                    'vertices': annot.vertices if hasattr(annot, 'vertices') else None,
-                    'line_endpoints': annot.line_endpoints if hasattr(annot, 'line_endpoints') else None,
+                    'vertices': annot.vertices,
+                    'line_endpoints': getattr(annot, 'line_endpoints', None),
                     
                     # Additional properties
-                    'rotation': annot.rotation if hasattr(annot, 'rotation') else None,
-                    'quad_points': annot.quad_points if hasattr(annot, 'quad_points') else None,
-                    'is_open': annot.is_open if hasattr(annot, 'is_open') else None
+                    'rotation': annot.rotation,
+                    'quad_points': getattr(annot, 'quad_points', None),
+                    'is_open': annot.is_open
                 }
 
                 # Extract info dictionary properties
-                if hasattr(annot, 'info') and annot.info:
-                    info_dict = annot.info
+                if info:
                     info_properties = {
-                        'title': info_dict.get('title', ''),
-                        'subject': info_dict.get('subject', ''),
-                        'creator': info_dict.get('creator', ''),
-                        'content': info_dict.get('content', ''),
-                        'name': info_dict.get('name', ''),
-                        'state': info_dict.get('state', ''),
-                        'state_model': info_dict.get('stateModel', '')
+                        'title': info.get('title', ''),
+                        'subject': info.get('subject', ''),
+                        'creator': info.get('creator', ''),
+                        'content': info.get('content', ''),
+                        'name': info.get('name', ''),
+                        'state': info.get('state', ''),
+                        'state_model': info.get('stateModel', '')
                     }
                     annot_info.update(info_properties)
 
                     # Parse dates
-                    creation_date = info_dict.get('creationDate', '')
+                    creation_date = info.get('creationDate', '')
                     if creation_date:
                         try:
                             parsed_date = parse_pdf_date(creation_date)
                             if parsed_date:
                                 annot_info['creation_date'] = parsed_date.strftime('%Y-%m-%d %H:%M:%S')
                         except Exception as e:
-                            logging.debug(f"Error parsing creation date: {e}")
+                            logger.debug("Error parsing creation date: %s", e)
 
-                    mod_date = info_dict.get('modDate', '')
+                    mod_date = info.get('modDate', '')
                     if mod_date:
                         try:
                             parsed_date = parse_pdf_date(mod_date)
                             if parsed_date:
                                 annot_info['modification_date'] = parsed_date.strftime('%Y-%m-%d %H:%M:%S')
                         except Exception as e:
-                            logging.debug(f"Error parsing modification date: {e}")
+                            logger.debug("Error parsing modification date: %s", e)
 
                 # Extract colors in hex format
                 if annot_info['colors']['stroke']:
                     try:
-                        rgb = tuple(int(c * 255) for c in annot_info['colors']['stroke'][:3])
-                        annot_info['stroke_color'] = rgb_to_hex(rgb)
+                        r, g, b = (int(c * 255) for c in annot_info['colors']['stroke'][:3])
+                        annot_info['stroke_color'] = int_to_hex(r << 16 | g << 8 | b)
                     except Exception as e:
-                        logging.debug(f"Error converting stroke color: {e}")
+                        logger.debug("Error converting stroke color: %s", e)
 
                 if annot_info['colors']['fill']:
                     try:
-                        rgb = tuple(int(c * 255) for c in annot_info['colors']['fill'][:3])
-                        annot_info['fill_color'] = rgb_to_hex(rgb)
+                        r, g, b = (int(c * 255) for c in annot_info['colors']['fill'][:3])
+                        annot_info['fill_color'] = int_to_hex(r << 16 | g << 8 | b)
                     except Exception as e:
-                        logging.debug(f"Error converting fill color: {e}")
+                        logger.debug("Error converting fill color: %s", e)
 
                 # Extract font properties for FreeText annotations
                 if annot_info['type'] == 'FreeText':
                     try:
-                        if hasattr(annot, 'info'):
-                            da_string = annot.info.get('defaultAppearance', '')
-                            if da_string:
-                                # Font name and size
-                                font_match = re.search(r'/([^\s]+)\s+(\d+)\s+Tf', da_string)
-                                if font_match:
-                                    annot_info['font_name'] = font_match.group(1)
-                                    annot_info['font_size'] = int(font_match.group(2))
-
-                                # Font color
-                                color_match = re.search(r'(\d*\.?\d+)\s+(\d*\.?\d+)\s+(\d*\.?\d+)\s+rg', da_string)
-                                if color_match:
-                                    rgb = tuple(int(float(c) * 255) for c in color_match.groups())
-                                    annot_info['font_color'] = rgb_to_hex(rgb)
+                        da_string = info.get('defaultAppearance', '')
+                        # Font name, size and color in a single scan; the first
+                        # occurrence of each operator wins
+                        for match in _DA_RE.finditer(da_string):
+                            if match.group(1):
+                                if 'font_name' not in annot_info:
+                                    annot_info['font_name'] = match.group(1)
+                                    annot_info['font_size'] = int(match.group(2))
+                            elif 'font_color' not in annot_info:
+                                r, g, b = (int(float(c) * 255) for c in match.group(3, 4, 5))
+                                annot_info['font_color'] = int_to_hex(r << 16 | g << 8 | b)
                     except Exception as e:
-                        logging.debug(f"Error extracting font properties: {e}")
+                        logger.debug("Error extracting font properties: %s", e)
+
+                # Drop the colors dict up front so the cleanup never compares dicts
+                if not annot_info['colors']['stroke'] and not annot_info['colors']['fill']:
+                    del annot_info['colors']
 
                 # Clean up the annotation info by removing None and empty values
                 cleaned_info = {}
                 for key, value in annot_info.items():
-                    if value not in (None, '', [], {}, {'stroke': None, 'fill': None}):
+                    if isinstance(value, (list, dict)):
+                        if value:
+                            cleaned_info[key] = value
+                    elif value not in _EMPTY:
                         cleaned_info[key] = value
 
                 if cleaned_info:
                     annotations.append(cleaned_info)
-                    logging.debug(f"Successfully extracted annotation from page {page_number}: {cleaned_info['type']}")
+                    logger.debug("Successfully extracted annotation from page %s: %s", page_number, cleaned_info['type'])
 
             except Exception as e:
-                logging.error(f"Error processing annotation on page {page_number}: {e}")
+                logger.error(f"Error processing annotation on page {page_number}: {e}")
                 continue
 
     except Exception as e:
-        logging.error(f"Error accessing annotations on page {page_number}: {e}")
+        logger.error(f"Error accessing annotations on page {page_number}: {e}")
         return []
 
     return annotations
 
-def extract_pdf_info(pdf_path, max_pages=None):
-    logging.info(f"Starting to extract PDF info from: {pdf_path}")
+def int_to_hex(color_int):
+    """Convert a packed 0xRRGGBB color integer to a hex color code."""
+    return f"#{color_int & 0xFFFFFF:06X}"
+
+def extract_page(page, page_number):
+    """
+    Extract text, annotations, and style attributes from a single page.
+
+    Returns a (page_data, annotations, styled_text) tuple.
+    """
+    logger.info(f"Processing page {page_number}")
+
+    # Build the text layout once and reuse it for plain and styled text;
+    # image blocks are not needed, so plain-text flags are enough
+    textpage = page.get_textpage(flags=fitz.TEXTFLAGS_TEXT)
+
+    # Extract page text
+    page_text = textpage.extractText().strip()
+    page_data = {
+        'page_number': page_number,
+        'text': page_text
+    }
+
+    # Extract annotations using the new function
+    page_annotations = extract_annotations(page, page_number)
+
+    # Extract styled text; MuPDF always populates these span keys, so index
+    # them directly and keep the append bound as a local in the inner loop
+    styled_text = []
+    append_span = styled_text.append
+    try:
+        blocks = textpage.extractDICT()["blocks"]
+        for block in blocks:
+            if block["type"] == 0:
+                for line in block["lines"]:
+                    for span in line["spans"]:
+                        x0, y0, x1, y1 = span["bbox"]
+                        append_span(StyledSpan(
+                            page_number,
+                            span["text"].strip(),
+                            span["font"],
+                            span["size"],
+                            int_to_hex(span["color"]),
+                            [round(x0, 3), round(y0, 3), round(x1, 3), round(y1, 3)],
+                        ))
+    except Exception as e:
+        logger.error(f"Error extracting styled text on page {page_number}: {e}", exc_info=True)
+
+    return page_data, page_annotations, styled_text
+
+def extract_page_range(pdf_path, start, stop):
+    """
+    Worker for extract_pdf_info: extract pages [start, stop) of a PDF.
+
+    The document is reopened here because PyMuPDF documents cannot be
+    passed between processes. Returns (pages, annotations, styled_text).
+    """
+    pages, annotations, styled_text = [], [], []
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(start, stop):
+            page_data, page_annotations, page_styled_text = extract_page(doc[page_num], page_num + 1)
+            pages.append(page_data)
+            annotations.extend(page_annotations)
+            styled_text.extend(page_styled_text)
+    return pages, annotations, styled_text
+
+def extract_pdf_info(pdf_path, max_pages=None, num_workers=None):
+    logger.info(f"Starting to extract PDF info from: {pdf_path}")
     pdf_data = {'bookmarks': [], 'pages': [], 'annotations': [], 'styled_text': []}
 
     if not os.path.exists(pdf_path):
-        logging.error(f"PDF file not found: {pdf_path}")
+        logger.error(f"PDF file not found: {pdf_path}")
         return None
 
     try:
         with fitz.open(pdf_path) as doc:
             total_pages = len(doc)
-            logging.info(f"Successfully opened the PDF. Number of pages: {total_pages}")
+            logger.info(f"Successfully opened the PDF. Number of pages: {total_pages}")
         
-            # Log PDF metadata for debugging
-            logging.info(f"PDF Version: {doc.metadata.get('format', 'Unknown')}")
-            logging.info(f"PDF Producer: {doc.metadata.get('producer', 'Unknown')}")
+            # Log PDF metadata for debugging; doc.metadata is rebuilt on each access
+            if logger.isEnabledFor(logging.INFO):
+                metadata = doc.metadata
+                logger.info(f"PDF Version: {metadata.get('format', 'Unknown')}")
+                logger.info(f"PDF Producer: {metadata.get('producer', 'Unknown')}")
 
             # Limit the number of pages if max_pages is set
             if max_pages is not None:
@@ -207,251 +361,201 @@ def extract_pdf_info(pdf_path, max_pages=None):
             # Extract bookmarks
             pdf_data['bookmarks'] = doc.get_toc()
             if not pdf_data['bookmarks']:
-                logging.info("No bookmarks found in the PDF.")
+                logger.info("No bookmarks found in the PDF.")
 
             all_annotations = []
             all_styled_text = []
             all_pages = []
 
-            # Function to convert color integer to RGB tuple
-            def int_to_rgb(color_int):
-                """Convert a color integer to an RGB tuple."""
-                r = (color_int >> 16) & 255
-                g = (color_int >> 8) & 255
-                b = color_int & 255
-                return (r, g, b)
-
+            # Never start more workers than there are pages
+            if num_workers is None:
+                num_workers = min(os.cpu_count() or 1, 4)
+            num_workers = max(1, min(num_workers, max_pages))
 
             # Extract text, annotations, and style attributes for each page
-            for page_num in range(max_pages):
-                page = doc[page_num]
-                page_number = page_num + 1
-                logging.info(f"Processing page {page_number}")
-
-                # Extract page text
-                page_text = page.get_text().strip()
-                page_data = {
-                    'page_number': page_number,
-                    'text': page_text
-                }
-                all_pages.append(page_data)
-
-                # Extract annotations using the new function
-                page_annotations = extract_annotations(page, page_number)
-                all_annotations.extend(page_annotations)
-
-                # Extract styled text
-                try:
-                    blocks = page.get_text("dict")["blocks"]
-                    for block in blocks:
-                        if block['type'] == 0:
-                            for line in block['lines']:
-                                for span in line['spans']:
-                                    color = span.get('color', 0)
-                                    color_rgb = int_to_rgb(color)
-                                    font_color_hex = rgb_to_hex(color_rgb)
-                                    span_info = {
-                                        'page_number': page_number,
-                                        'text': span.get('text', '').strip(),
-                                        'font': span.get('font', ''),
-                                        'font_size': span.get('size', ''),
-                                        'font_color': font_color_hex,
-                                        'bbox': [round(coord, 3) for coord in span.get('bbox', [])],
-                                    }
-                                    # Remove empty fields
-                                    span_info = {k: v for k, v in span_info.items() if v not in ['', None]}
-                                    all_styled_text.append(span_info)
-                except Exception as e:
-                    logging.error(f"Error extracting styled text on page {page_number}: {e}", exc_info=True)
+            if num_workers == 1:
+                for page_num in range(max_pages):
+                    page_data, page_annotations, page_styled_text = extract_page(doc[page_num], page_num + 1)
+                    all_pages.append(page_data)
+                    all_annotations.extend(page_annotations)
+                    all_styled_text.extend(page_styled_text)
+            else:
+                # Split the pages into one contiguous chunk per worker
+                chunk_size = -(-max_pages // num_workers)
+                with ProcessPoolExecutor(max_workers=num_workers) as executor:
+                    futures = [
+                        executor.submit(extract_page_range, pdf_path, start, min(start + chunk_size, max_pages))
+                        for start in range(0, max_pages, chunk_size)
+                    ]
+                    # Merge results in page-number order
+                    for future in futures:
+                        pages, annotations, styled_text = future.result()
+                        all_pages.extend(pages)
+                        all_annotations.extend(annotations)
+                        all_styled_text.extend(styled_text)
 
             pdf_data['pages'] = all_pages
             pdf_data['annotations'] = all_annotations
             pdf_data['styled_text'] = all_styled_text
 
-            logging.info(f"Extracted {len(all_annotations)} annotations across {max_pages} pages")
+            logger.info(f"Extracted {len(all_annotations)} annotations across {max_pages} pages")
             return pdf_data
 
     except Exception as e:
-        logging.error(f"An error occurred while processing the PDF: {e}", exc_info=True)
+        logger.error(f"An error occurred while processing the PDF: {e}", exc_info=True)
         return None
 
-def rgb_to_hex(rgb):
-    """Convert RGB tuple to hex color code."""
-    try:
-        return '#{:02X}{:02X}{:02X}'.format(*rgb)
-    except Exception:
-        return ''
-
 def clean_value_for_excel(value):
     """Clean value for Excel export."""
     if value is None:
         return ''
-    if isinstance(value, (list, dict)):
-        return str(value).replace('\x00', '').replace('\r', '')
-    return str(value).replace('\x00', '').replace('\r', '')
+    if isinstance(value, (list, tuple, dict)):
+        # Valid JSON is easier to parse downstream than the Python repr
+        value = json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=str)
+    else:
+        value = str(value)
+    # Scanning is cheaper than copying, and most text has nothing to strip
+    if '\x00' in value or '\r' in value:
+        return value.translate(_BAD_CHARS)
+    return value
+
+
+
+def iter_report_sheets(formatted_data):
+    """
+    Yield (title, headers, records) for each report sheet.
+
+    Records are raw value sequences; writers clean them with clean_value_for_excel.
+    """
+    # Summary sheet
+    yield "Summary", ["Component", "Count"], (
+        (component.get('Component', ''), component.get('Count', ''))
+        for component in formatted_data['summary']['components']
+    )
+
+    # Annotations sheet
+    if formatted_data['sheets']['annotations']:
+        headers = [
+            'Page Number', 'Annotation Type', 'Content', 'Position',
+            'flags', 'colors stroke', 'colors fill', 'Stroke Color',
+            'Opacity', 'Border Width', 'Border Dashes', 'Border Style',
+            'Border Clouds', 'Rotation', 'Is Open', 'Popup Rectangle'
+        ]
+        yield "Annotations", headers, (
+            [annot.get(header, '') for header in headers]
+            for annot in formatted_data['sheets']['annotations']
+        )
 
+    # Bookmarks sheet
+    if formatted_data['sheets']['bookmarks']:
+        yield "Bookmarks", ['Level', 'Title', 'Page'], (
+            (bookmark.get('Level', ''), bookmark.get('Title', ''), bookmark.get('Page', ''))
+            for bookmark in formatted_data['sheets']['bookmarks']
+        )
 
+    # Pages sheet
+    if formatted_data['sheets']['pages']:
+        yield "Pages", ['Page Number', 'Text'], (
+            (page.get('Page Number', ''), page.get('Text', ''))
+            for page in formatted_data['sheets']['pages']
+        )
+
+    # Styled Text sheet
+    if formatted_data['sheets']['styled_text']:
+        yield "Styled Text", ['Page Number', 'Text', 'Font', 'Font Size', 'Font Color', 'Position'], (
+            (
+                text.get('Page Number', ''),
+                text.get('Text', ''),
+                text.get('Font', ''),
+                text.get('Font Size', ''),
+                text.get('Font Color', ''),
+                clean_value_for_excel(text.get('Position', '')).replace('=', '')  # Prevent formula injection
+            )
+            for text in formatted_data['sheets']['styled_text']
+        )
 
 def save_to_excel(formatted_data, output_path):
     """Save formatted JSON data to Excel with enhanced styling and filters."""
     try:
-        # Create workbook in normal mode for styling support
-        wb = Workbook()
-        
-        # Define common styles
-        header_fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-        header_font = Font(name='Calibri', size=11, bold=True, color="FFFFFF")
-        header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        data_alignment = Alignment(vertical='center', wrap_text=True)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        # Create workbook in write-only mode so rows are streamed to disk
+        wb = Workbook(write_only=True)
+
+        for title, headers, records in iter_report_sheets(formatted_data):
+            ws = wb.create_sheet(title)
+
+            # Clean rows and track column widths in the same pass
+            widths = [len(header) for header in headers]
+            rows = []
+            for record in records:
+                row = []
+                for i, value in enumerate(record):
+                    value = clean_value_for_excel(value)
+                    if len(value) > widths[i]:
+                        widths[i] = len(value)
+                    row.append(value)
+                rows.append(row)
+
+            # Adjust column widths; write-only sheets emit these before the first row
+            for i, width in enumerate(widths, start=1):
+                ws.column_dimensions[get_column_letter(i)].width = min(width + 2, 50)  # Cap width at 50
 
-        def apply_sheet_styling(ws, start_col, end_col):
-            """Helper function to apply consistent styling to sheets"""
-            # Apply autofilter
-            ws.auto_filter.ref = ws.dimensions
-            
-            # Format headers
-            for cell in ws[1]:
-                cell.fill = header_fill
-                cell.font = header_font
-                cell.alignment = header_alignment
-                cell.border = border
-            
-            # Format data cells
-            for row in ws.iter_rows(min_row=2):
-                for cell in row:
-                    cell.alignment = data_alignment
-                    cell.border = border
-            
-            # Adjust column widths
-            for col in ws.columns:
-                max_length = 0
-                column = list(col)
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 50)  # Cap width at 50
-                ws.column_dimensions[col[0].column_letter].width = adjusted_width
-            
             # Freeze top row
             ws.freeze_panes = 'A2'
             
             # Set zoom level
             ws.sheet_view.zoomScale = 85
 
-        # Remove default sheet
-        wb.remove(wb.active)
-
-        # Create Summary sheet
-        ws_summary = wb.create_sheet("Summary")
-        ws_summary.append(["Component", "Count"])
-        for component in formatted_data['summary']['components']:
-            ws_summary.append([
-                str(component.get('Component', '')),
-                str(component.get('Count', ''))
-            ])
-        apply_sheet_styling(ws_summary, 'A', 'B')
-
-        # Create Annotations sheet
-        if formatted_data['sheets']['annotations']:
-            ws_annotations = wb.create_sheet("Annotations")
-            
-            headers = [
-                'Page Number', 'Annotation Type', 'Content', 'Position',
-                'flags', 'colors stroke', 'colors fill', 'Stroke Color',
-                'Opacity', 'Border Width', 'Border Dashes', 'Border Style',
-                'Border Clouds', 'Rotation', 'Flags', 'Is Open', 'Popup Rectangle'
-            ]
-            
-            ws_annotations.append(headers)
-            
-            for annot in formatted_data['sheets']['annotations']:
-                row = []
-                for header in headers:
-                    value = annot.get(header, '')
-                    if isinstance(value, (list, dict)):
-                        value = str(value)
-                    row.append(str(value))
-                ws_annotations.append(row)
-            
-            apply_sheet_styling(ws_annotations, 'A', 'Q')
-
-        # Create Bookmarks sheet
-        if formatted_data['sheets']['bookmarks']:
-            ws_bookmarks = wb.create_sheet("Bookmarks")
-            ws_bookmarks.append(['Level', 'Title', 'Page'])
-            for bookmark in formatted_data['sheets']['bookmarks']:
-                ws_bookmarks.append([
-                    str(bookmark.get('Level', '')),
-                    str(bookmark.get('Title', '')),
-                    str(bookmark.get('Page', ''))
-                ])
-            apply_sheet_styling(ws_bookmarks, 'A', 'C')
-
-        # Create Pages sheet
-        if formatted_data['sheets']['pages']:
-            ws_pages = wb.create_sheet("Pages")
-            ws_pages.append(['Page Number', 'Text'])
-            for page in formatted_data['sheets']['pages']:
-                ws_pages.append([
-                    str(page.get('Page Number', '')),
-                    str(page.get('Text', '')).replace('\x00', '').replace('\r', '')
-                ])
-            apply_sheet_styling(ws_pages, 'A', 'B')
-
-        # Create Styled Text sheet
-        if formatted_data['sheets']['styled_text']:
-            ws_styled = wb.create_sheet("Styled Text")
-            ws_styled.append(['Page Number', 'Text', 'Font', 'Font Size', 'Font Color', 'Position'])
-            for text in formatted_data['sheets']['styled_text']:
-                ws_styled.append([
-                    str(text.get('Page Number', '')),
-                    str(text.get('Text', '')),
-                    str(text.get('Font', '')),
-                    str(text.get('Font Size', '')),
-                    str(text.get('Font Color', '')),
-                    str(text.get('Position', '')).replace('=', '')  # Prevent formula injection
-                ])
-            apply_sheet_styling(ws_styled, 'A', 'F')
+            # Apply autofilter
+            ws.auto_filter.ref = f"A1:{get_column_letter(len(headers))}{len(rows) + 1}"
+
+            # Format headers; cells cannot be revisited once appended
+            header_cells = []
+            for header in headers:
+                cell = WriteOnlyCell(ws, value=header)
+                cell.fill = HEADER_FILL
+                cell.font = HEADER_FONT
+                cell.alignment = HEADER_ALIGN
+                cell.border = BORDER
+                header_cells.append(cell)
+            ws.append(header_cells)
+
+            for row in rows:
+                ws.append(row)
 
         # Save workbook
         wb.save(filename=output_path)
-        logging.info(f"Successfully saved Excel file to: {output_path}")
+        logger.info(f"Successfully saved Excel file to: {output_path}")
         
     except Exception as e:
-        logging.error(f"Failed to create Excel workbook: {e}", exc_info=True)
+        logger.error(f"Failed to create Excel workbook: {e}", exc_info=True)
         raise
 
-def clean_data_for_excel(data):
-    """Clean data before converting to DataFrame."""
-    if isinstance(data, dict):
-        return {k: clean_data_for_excel(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [clean_data_for_excel(item) for item in data]
-    elif isinstance(data, (int, float)):
-        return str(data)
-    elif isinstance(data, str):
-        # Remove problematic characters
-        return data.replace('\x00', '').replace('\r', '')
-    elif data is None:
-        return ''
-    else:
-        return str(data)
+def save_to_csv(formatted_data, output_dir, base_name):
+    """Save each report sheet as a plain CSV file named {base_name}_{sheet}.csv."""
+    try:
+        for title, headers, records in iter_report_sheets(formatted_data):
+            csv_path = os.path.join(output_dir, f"{base_name}_{title.lower().replace(' ', '_')}.csv")
+            with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
+                writer.writerow(headers)
+                writer.writerows(
+                    [clean_value_for_excel(value) for value in record]
+                    for record in records
+                )
+            logger.info(f"Successfully saved CSV file to: {csv_path}")
+
+    except Exception as e:
+        logger.error(f"Failed to create CSV files: {e}", exc_info=True)
+        raise
 
 def process_pdf(
     pdf_path, 
     output_dir=None, 
     max_pages=None,
     formatted_json_name=None,
-    excel_name=None
+    excel_name=None,
+    num_workers=None,
+    output_format="xlsx"
 ):
     """
     Main function implementing the three-step process.
@@ -462,8 +566,15 @@ def process_pdf(
         max_pages (int, optional): Maximum number of pages to process
         formatted_json_name (str, optional): Name for the formatted JSON file
         excel_name (str, optional): Name for the Excel output file
+        num_workers (int, optional): Number of worker processes for page extraction.
+            If None, uses up to 4 based on the CPU count; 1 disables multiprocessing
+        output_format (str, optional): "xlsx" for the Excel report (default) or "csv"
+            for one {base_name}_{sheet}.csv file per sheet
     """
     try:
+        if output_format not in ("xlsx", "csv"):
+            raise ValueError(f"Unsupported output format: {output_format}")
+
         # Generate file paths
         if output_dir is None:
             output_dir = os.path.dirname(pdf_path)
@@ -486,49 +597,58 @@ def process_pdf(
         )
 
         # Step 1: Extract PDF info and save to JSON
-        logging.info("Step 1: Extracting PDF info...")
-        result = extract_pdf_info(pdf_path, max_pages)
+        logger.info("Step 1: Extracting PDF info...")
+        result = extract_pdf_info(pdf_path, max_pages, num_workers)
         if result:
-            save_to_json(result, json_path)
-            logging.info(f"Step 1 complete: Raw data saved to {json_path}")
-
-            # Step 2: Create formatted JSON
-            logging.info("Step 2: Creating formatted JSON...")
-            formatted_data = create_formatted_json(json_path, formatted_json_path)
-            logging.info(f"Step 2 complete: Formatted data saved to {formatted_json_path}")
-
-            # Clean data before saving to Excel
-            cleaned_data = clean_data_for_excel(formatted_data)
-
-            # Step 3: Generate Excel file
-            logging.info("Step 3: Generating Excel file...")
-            save_to_excel(cleaned_data, excel_path)
-            logging.info(f"Step 3 complete: Excel file saved to {excel_path}")
+            # Styled text spans are written out as JSON objects
+            raw_json = dict(result, styled_text=[span._asdict() for span in result['styled_text']])
+            save_to_json(raw_json, json_path)
+            logger.info(f"Step 1 complete: Raw data saved to {json_path}")
+
+            # Step 2: Create formatted JSON from the in-memory extraction
+            logger.info("Step 2: Creating formatted JSON...")
+            formatted_data = create_formatted_json(result, formatted_json_path)
+            logger.info(f"Step 2 complete: Formatted data saved to {formatted_json_path}")
+
+            # Step 3: Generate Excel or CSV output; values are cleaned as rows are written
+            if output_format == "csv":
+                logger.info("Step 3: Generating CSV files...")
+                save_to_csv(formatted_data, output_dir, base_name)
+                logger.info(f"Step 3 complete: CSV files saved to {output_dir}")
+            else:
+                logger.info("Step 3: Generating Excel file...")
+                save_to_excel(formatted_data, excel_path)
+                logger.info(f"Step 3 complete: Excel file saved to {excel_path}")
         else:
-            logging.error("Failed to extract PDF information")
+            logger.error("Failed to extract PDF information")
 
     except Exception as e:
-        logging.error(f"Error in process_pdf: {e}", exc_info=True)
+        logger.error(f"Error in process_pdf: {e}", exc_info=True)
 
-    logging.info("Script finished")
+    logger.info("Script finished")
+
+def write_json(data, output_path):
+    """Write data as JSON, using orjson when it is installed."""
+    if orjson is not None:
+        with open(output_path, 'wb') as f:
+            f.write(orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        # The stdlib C encoder is only used for unindented one-shot dumps
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(data, ensure_ascii=False, default=str))
 
 def save_to_json(data, output_path):
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-            logging.info(f"Extracted information saved to JSON: {output_path}")
+        write_json(data, output_path)
+        logger.info(f"Extracted information saved to JSON: {output_path}")
     except Exception as e:
-        logging.error(f"Failed to save JSON file: {e}", exc_info=True)
+        logger.error(f"Failed to save JSON file: {e}", exc_info=True)
 
-def create_formatted_json(input_json_path, output_json_path):
+def create_formatted_json(raw_data, output_json_path):
     """
-    Step 2: Read acrf.json and create p_01_02_acrf_excel_ready_format.json with Excel-ready format
+    Step 2: Convert the extracted PDF data into the Excel-ready format and save it as JSON
     """
     try:
-        # Read the original JSON file
-        with open(input_json_path, 'r', encoding='utf-8') as f:
-            raw_data = json.load(f)
-        
         # Initialize Excel-ready format
         excel_ready_data = {
             'summary': {
@@ -547,26 +667,26 @@ def create_formatted_json(input_json_path, output_json_path):
             }
         }
 
-        # Format annotations
+        # Format annotations; only free-text fields are cleaned here, structured
+        # values are stringified by save_to_excel as rows are written
         for annot in raw_data.get('annotations', []):
             formatted_annot = {
                 'Page Number': annot.get('page_number', ''),
                 'Annotation Type': annot.get('type', ''),
-                'Content': annot.get('content', ''),
-                'Position': clean_value_for_excel(annot.get('rect', '')),
+                'Content': clean_value_for_excel(annot.get('content', '')),
+                'Position': annot.get('rect', ''),
                 'flags': annot.get('flags', ''),
-                'colors stroke': clean_value_for_excel(annot.get('colors', {}).get('stroke', '')),
-                'colors fill': clean_value_for_excel(annot.get('colors', {}).get('fill', '')),
+                'colors stroke': annot.get('colors', {}).get('stroke', ''),
+                'colors fill': annot.get('colors', {}).get('fill', ''),
                 'Stroke Color': annot.get('stroke_color', ''),
                 'Opacity': annot.get('opacity', ''),
                 'Border Width': annot.get('border', {}).get('width', ''),
-                'Border Dashes': clean_value_for_excel(annot.get('border', {}).get('dashes', '')),
+                'Border Dashes': annot.get('border', {}).get('dashes', ''),
                 'Border Style': annot.get('border', {}).get('style', ''),
                 'Border Clouds': annot.get('border', {}).get('clouds', ''),
                 'Rotation': annot.get('rotation', ''),
-                'Flags': annot.get('flags', ''),
                 'Is Open': annot.get('is_open', ''),
-                'Popup Rectangle': clean_value_for_excel(annot.get('popup_rect', ''))
+                'Popup Rectangle': annot.get('popup_rect', '')
             }
             
             # Add to sheets
@@ -594,24 +714,23 @@ def create_formatted_json(input_json_path, output_json_path):
         # Format styled text
         for text in raw_data.get('styled_text', []):
             formatted_text = {
-                'Page Number': text.get('page_number', ''),
-                'Text': clean_value_for_excel(text.get('text', '')),
-                'Font': text.get('font', ''),
-                'Font Size': text.get('font_size', ''),
-                'Font Color': text.get('font_color', ''),
-                'Position': str(text.get('bbox', ''))
+                'Page Number': text.page_number,
+                'Text': clean_value_for_excel(text.text),
+                'Font': text.font,
+                'Font Size': text.font_size,
+                'Font Color': text.font_color,
+                'Position': text.bbox
             }
             excel_ready_data['sheets']['styled_text'].append(formatted_text)
 
         # Save the formatted JSON
-        with open(output_json_path, 'w', encoding='utf-8') as f:
-            json.dump(excel_ready_data, f, ensure_ascii=False, indent=2)
+        write_json(excel_ready_data, output_json_path)
         
-        logging.info(f"Successfully created formatted JSON at: {output_json_path}")
+        logger.info(f"Successfully created formatted JSON at: {output_json_path}")
         return excel_ready_data
 
     except Exception as e:
-        logging.error(f"Error creating formatted JSON: {e}", exc_info=True)
+        logger.error(f"Error creating formatted JSON: {e}", exc_info=True)
         raise
 
 if __name__ == "__main__":